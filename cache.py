@@ -0,0 +1,42 @@
+"""
+Response Cache
+
+Short-lived in-process cache for read-heavy list endpoints.
+Cached bodies are keyed by endpoint, query parameters and a per-collection
+version that is bumped on every write. Writes invalidate immediately within
+the worker that made them; other workers keep serving their cached copy
+until the 10 s TTL expires.
+
+Only fully rendered bodies are cached. Streaming responses are passed
+through untouched, since caching them would buffer the whole result.
+"""
+
+from collections import defaultdict
+from functools import wraps
+
+from cachetools import TTLCache
+from fastapi.responses import Response, StreamingResponse
+
+_cache = TTLCache(maxsize=1024, ttl=10)
+_versions = defaultdict(int)
+
+def invalidate(*collection_names: str):
+    """Drop cached responses built from the given collections"""
+    for name in collection_names:
+        _versions[name] += 1
+
+def cached_response(collection_name: str):
+    """Cache the JSON body of an async list endpoint that reads collection_name"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(**kwargs):
+            key = (func.__name__, frozenset(kwargs.items()), _versions[collection_name])
+            body = _cache.get(key)
+            if body is not None:
+                return Response(body, media_type="application/json")
+            response = await func(**kwargs)
+            if not isinstance(response, StreamingResponse):
+                _cache[key] = response.body
+            return response
+        return wrapper
+    return decorator
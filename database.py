@@ -5,32 +5,76 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import InsertOne, WriteConcern
+from bson import ObjectId
 from datetime import datetime, timezone
+import asyncio
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Tuple, Union
 from pydantic import BaseModel
 
+from cache import invalidate
+
 # Load environment variables from .env file
 load_dotenv()
 
 _client = None
 db = None
+# Collections written with a non-default write concern, built once
+_relaxed_collections = {}
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    # One client per process; Motor manages the connection pool internally.
+    # Each uvicorn worker gets its own pool, so size it as
+    # floor(cluster connection limit / workers) minus some headroom.
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=int(os.getenv("MONGO_POOL_SIZE", "20")),
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL", "5")),
+        waitQueueTimeoutMS=2000,
+        serverSelectionTimeoutMS=3000,
+    )
     db = _client[database_name]
+    # Notifications are a fire-and-forget audit trail; acknowledge their writes
+    # without waiting for the journal so the parent write returns sooner
+    _relaxed_collections["notification"] = db.get_collection(
+        "notification", write_concern=WriteConcern(w=1, j=False)
+    )
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+def _collection(collection_name: str):
+    relaxed = _relaxed_collections.get(collection_name)
+    if relaxed is not None:
+        return relaxed
+    return db[collection_name]
+
+async def ping():
+    """Round-trip to the server so the pool is connected before serving traffic"""
+    if _client is not None:
+        await _client.admin.command("ping")
+
+def close():
+    """Close the client and its pooled connections"""
+    if _client is not None:
+        _client.close()
+
+async def ensure_indexes():
+    """Create the indexes backing the filters used by the list endpoints"""
     if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+        return
+    await asyncio.gather(
+        db["donor"].create_index([("eligible", 1), ("blood_group", 1)], background=True),
+        db["donor"].create_index([("email", 1)], unique=True, background=True),
+        db["request"].create_index([("status", 1), ("hospital_id", 1), ("donor_id", 1)], background=True),
+        db["inventory"].create_index([("hospital_id", 1), ("expiry_date", 1)], background=True),
+    )
 
+def _prepare_document(data: Union[BaseModel, dict]) -> dict:
+    """Copy data into a plain dict and stamp created/updated times"""
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
@@ -39,17 +83,80 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
 
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
+    return data_dict
 
-    result = db[collection_name].insert_one(data_dict)
+# Helper functions for common database operations
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    data_dict = _prepare_document(data)
+    result = await _collection(collection_name).insert_one(data_dict)
+    invalidate(collection_name)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+async def bulk_create(documents: List[Tuple[str, Union[BaseModel, dict]]]):
+    """Insert (collection, data) pairs with one bulk_write per collection, returning ids in input order
+
+    Collections are written one after another in order of first appearance, so
+    if a batch fails the batches after it (e.g. notifications) are not written.
+    That costs one round-trip per collection: batching only saves round-trips
+    when a collection gets many documents, as in /donors/bulk.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    prepared = []
+    grouped = {}
+    for collection_name, data in documents:
+        data_dict = _prepare_document(data)
+        # assign ids client-side so they are known without reading back
+        data_dict.setdefault('_id', ObjectId())
+        prepared.append(data_dict)
+        grouped.setdefault(collection_name, []).append(InsertOne(data_dict))
+
+    try:
+        for collection_name, ops in grouped.items():
+            await _collection(collection_name).bulk_write(ops, ordered=False)
+    finally:
+        # a failed unordered batch may still have inserted some documents
+        invalidate(*grouped)
+    return [str(d['_id']) for d in prepared]
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally restricted to the projected fields"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
-    if limit:
-        cursor = cursor.limit(limit)
-    
-    return list(cursor)
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    return await cursor.to_list(limit or None)
+
+def _list_pipeline(filter_dict: dict = None, limit: int = None, projection: dict = None):
+    pipeline = [{"$match": filter_dict or {}}]
+    # $limit only accepts positive values
+    if limit and limit > 0:
+        pipeline.append({"$limit": limit})
+    # rename server-side so responses need no per-document Python pass
+    pipeline.append({"$addFields": {"id": {"$toString": "$_id"}}})
+    if projection:
+        pipeline.append({"$project": {**projection, "id": 1, "_id": 0}})
+    else:
+        pipeline.append({"$project": {"_id": 0}})
+    return pipeline
+
+async def list_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents with _id exposed as a string "id", ready to serialize"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    pipeline = _list_pipeline(filter_dict, limit, projection)
+    return await db[collection_name].aggregate(pipeline).to_list(None)
+
+def stream_documents(collection_name: str, filter_dict: dict = None, projection: dict = None, batch_size: int = 500):
+    """Like list_documents, but returns a cursor to iterate batch by batch instead of a full list"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    pipeline = _list_pipeline(filter_dict, None, projection)
+    return db[collection_name].aggregate(pipeline, batchSize=batch_size)
@@ -1,107 +1,239 @@
+import logging
 import os
-from fastapi import FastAPI, HTTPException
+import re
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import orjson
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional
 from bson import ObjectId
-from datetime import datetime, date
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from datetime import datetime, time, timezone
 
-from database import db, create_document, get_documents
+from database import db, ping, close, ensure_indexes, create_document, bulk_create, list_documents, stream_documents
+from cache import cached_response
 from schemas import Donor, Hospital, Inventory, Request as RequestSchema, Notification
 
-app = FastAPI(title="Blood Donation Management API")
+logger = logging.getLogger(__name__)
+
+# Failures from startup database work, reported by /test
+startup_errors = {}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # warm the connection pool and make sure query indexes exist before the first request;
+    # keep serving if either fails
+    try:
+        await ping()
+    except Exception as e:
+        logger.exception("Database ping failed at startup")
+        startup_errors["ping"] = str(e)
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.exception("Index creation failed at startup")
+        startup_errors["indexes"] = str(e)
+    yield
+    close()
+
+def _json_default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError
+
+class MongoJSONResponse(ORJSONResponse):
+    """orjson response that also serializes ObjectId values"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_json_default)
+
+app = FastAPI(title="Blood Donation Management API", lifespan=lifespan, default_response_class=MongoJSONResponse)
+
+# Comma-separated list of allowed origins, e.g. "https://app.example.com,https://admin.example.com"
+cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["authorization", "content-type"],
 )
 
 # ---------------- Utility -----------------
 
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+@lru_cache(maxsize=4096)
+def _oid_cached(id_str: str) -> ObjectId:
+    # ObjectId is immutable, so parsed instances can be shared across calls
+    return ObjectId(id_str)
+
 def oid(id_str: str) -> ObjectId:
-    try:
-        return ObjectId(id_str)
-    except Exception:
+    # validate up front so malformed ids never go through ObjectId's exception path
+    if not _OID_RE.fullmatch(id_str):
         raise HTTPException(status_code=400, detail="Invalid object id")
+    return _oid_cached(id_str)
+
+async def _json_array_chunks(first_batch, documents, chunk_size: int):
+    buf = [orjson.dumps(doc, default=_json_default) for doc in first_batch]
+    yield b"[" + b",".join(buf)
+    sep = b"," if buf else b""
+    if len(first_batch) == chunk_size:
+        # cursor may have more; stream the rest batch by batch
+        buf = []
+        async for doc in documents:
+            buf.append(orjson.dumps(doc, default=_json_default))
+            if len(buf) >= chunk_size:
+                yield sep + b",".join(buf)
+                sep = b","
+                buf = []
+        if buf:
+            yield sep + b",".join(buf)
+    yield b"]"
+
+async def json_array_response(documents, chunk_size: int = 500) -> StreamingResponse:
+    """Stream a cursor as a JSON array, one chunk per batch
 
-# Eligibility logic
+    The first batch is fetched before the response starts, so connection and
+    query errors still surface as a proper error status instead of a
+    truncated 200 body.
+    """
+    first_batch = await documents.to_list(chunk_size)
+    return StreamingResponse(_json_array_chunks(first_batch, documents, chunk_size), media_type="application/json")
 
-def compute_eligibility(donor: Donor) -> bool:
-    return donor.age >= 18 and donor.age <= 65 and donor.health_ok
+DUPLICATE_KEY = 11000
+
+def is_duplicate_key(exc: Exception) -> bool:
+    """True if a write failed only because of unique index violations"""
+    if isinstance(exc, DuplicateKeyError):
+        return True
+    if isinstance(exc, BulkWriteError):
+        errors = exc.details.get("writeErrors", [])
+        return bool(errors) and all(e.get("code") == DUPLICATE_KEY for e in errors)
+    return False
 
 # ---------------- Donor Endpoints -----------------
 
 @app.post("/donors", response_model=dict)
-def register_donor(payload: Donor):
+async def register_donor(payload: Donor):
     data = payload.model_dump()
-    data["eligible"] = compute_eligibility(payload)
-    donor_id = create_document("donor", data)
-    # send notification stub
-    create_document("notification", {
-        "to_email": data.get("email"),
-        "subject": "Registration Successful",
-        "message": f"Hello {data.get('name')}, your donor profile has been registered.",
-    })
+    # send notification stub once the donor insert succeeds
+    try:
+        donor_id, _ = await bulk_create([
+            ("donor", data),
+            ("notification", {
+                "to_email": data.get("email"),
+                "subject": "Registration Successful",
+                "message": f"Hello {data.get('name')}, your donor profile has been registered.",
+            }),
+        ])
+    except (DuplicateKeyError, BulkWriteError) as e:
+        if not is_duplicate_key(e):
+            raise
+        raise HTTPException(409, "A donor with this email already exists")
     return {"id": donor_id, "eligible": data["eligible"]}
 
+# Upper bound on rows per /donors/bulk call; larger uploads get a 422
+MAX_BULK_DONORS = 1000
+
+@app.post("/donors/bulk", response_model=List[dict])
+async def register_donors_bulk(payloads: Annotated[List[Donor], Field(max_length=MAX_BULK_DONORS)]):
+    donors = []
+    for payload in payloads:
+        data = payload.model_dump()
+        data["_id"] = ObjectId()
+        donors.append(data)
+    # one unordered batched write for the whole upload; rows fail independently
+    errors = {}
+    try:
+        await bulk_create([("donor", data) for data in donors])
+    except BulkWriteError as e:
+        errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+        if not errors:
+            raise
+    # notify only donors that were actually stored
+    inserted = [data for i, data in enumerate(donors) if i not in errors]
+    if inserted:
+        await bulk_create([
+            ("notification", {
+                "to_email": data.get("email"),
+                "subject": "Registration Successful",
+                "message": f"Hello {data.get('name')}, your donor profile has been registered.",
+            })
+            for data in inserted
+        ])
+    results = []
+    for i, data in enumerate(donors):
+        if i in errors:
+            if errors[i].get("code") == DUPLICATE_KEY:
+                error = "A donor with this email already exists"
+            else:
+                error = "Could not register donor"
+            results.append({"index": i, "error": error})
+        else:
+            results.append({"index": i, "id": str(data["_id"]), "eligible": data["eligible"]})
+    # 207 Multi-Status when only some rows were stored
+    return MongoJSONResponse(results, status_code=207 if errors else 200)
+
 @app.get("/donors", response_model=List[dict])
-def list_donors(blood_group: Optional[str] = None, eligible_only: bool = True):
+async def list_donors(blood_group: Optional[str] = None, eligible_only: bool = True):
     query = {}
     if blood_group:
         query["blood_group"] = blood_group
     if eligible_only:
         query["eligible"] = True
-    donors = get_documents("donor", query, limit=None)
-    # convert ObjectId
-    for d in donors:
-        d["id"] = str(d.pop("_id"))
-    return donors
+    donors = stream_documents(
+        "donor", query,
+        projection={"name": 1, "blood_group": 1, "eligible": 1, "city": 1},
+    )
+    return await json_array_response(donors)
 
 # ---------------- Hospital Endpoints -----------------
 
 @app.post("/hospitals", response_model=dict)
-def create_hospital(payload: Hospital):
-    hid = create_document("hospital", payload)
+async def create_hospital(payload: Hospital):
+    hid = await create_document("hospital", payload)
     return {"id": hid}
 
 @app.get("/hospitals", response_model=List[dict])
-def list_hospitals():
-    items = get_documents("hospital", {}, None)
-    for it in items:
-        it["id"] = str(it.pop("_id"))
-    return items
+@cached_response("hospital")
+async def list_hospitals():
+    items = await list_documents("hospital", {}, None)
+    return MongoJSONResponse(items)
 
 # ---------------- Inventory Endpoints -----------------
 
 @app.post("/inventory", response_model=dict)
-def add_inventory(payload: Inventory):
+async def add_inventory(payload: Inventory):
     # ensure hospital exists
-    h = db["hospital"].find_one({"_id": oid(payload.hospital_id)})
+    h = await db["hospital"].find_one({"_id": oid(payload.hospital_id)}, {"_id": 1})
     if not h:
         raise HTTPException(404, "Hospital not found")
-    # add record
-    inv_id = create_document("inventory", payload)
+    # add record; store expiry as a BSON date so range queries can use the index
+    data = payload.model_dump()
+    data["expiry_date"] = datetime.combine(payload.expiry_date, time.min)
+    inv_id = await create_document("inventory", data)
     return {"id": inv_id}
 
 @app.get("/inventory", response_model=List[dict])
-def get_inventory(hospital_id: Optional[str] = None, include_expired: bool = False):
+async def get_inventory(hospital_id: Optional[str] = None, include_expired: bool = False):
     q = {}
     if hospital_id:
         q["hospital_id"] = hospital_id
     if not include_expired:
-        today = date.today().isoformat()
+        # naive datetimes are stored as UTC, so take today's date in UTC
+        today = datetime.combine(datetime.now(timezone.utc).date(), time.min)
         q["expiry_date"] = {"$gte": today}
-    items = get_documents("inventory", q, None)
-    for it in items:
-        it["id"] = str(it.pop("_id"))
-    return items
+    items = stream_documents("inventory", q)
+    return await json_array_response(items)
 
 @app.delete("/inventory/{inv_id}")
-def remove_inventory(inv_id: str):
-    res = db["inventory"].delete_one({"_id": oid(inv_id)})
+async def remove_inventory(inv_id: str):
+    res = await db["inventory"].delete_one({"_id": oid(inv_id)})
     if res.deleted_count == 0:
         raise HTTPException(404, "Inventory record not found")
     return {"status": "deleted"}
@@ -109,28 +241,43 @@ def remove_inventory(inv_id: str):
 # ---------------- Request & Approval -----------------
 
 @app.post("/requests", response_model=dict)
-def create_request(payload: RequestSchema):
-    # ensure entities exist
-    donor = db["donor"].find_one({"_id": oid(payload.donor_id)})
-    if not donor:
+async def create_request(payload: RequestSchema):
+    # ensure entities exist: fetch donor and hospital in a single round-trip
+    pipeline = [
+        {"$match": {"_id": oid(payload.donor_id)}},
+        {"$lookup": {
+            "from": "hospital",
+            "pipeline": [{"$match": {"_id": oid(payload.hospital_id)}}, {"$project": {"name": 1}}],
+            "as": "hospital",
+        }},
+        {"$project": {"email": 1, "hospital": {"$arrayElemAt": ["$hospital", 0]}}},
+    ]
+    found = await db["donor"].aggregate(pipeline).to_list(1)
+    if not found:
         raise HTTPException(404, "Donor not found")
-    hospital = db["hospital"].find_one({"_id": oid(payload.hospital_id)})
+    donor = found[0]
+    hospital = donor.get("hospital")
     if not hospital:
         raise HTTPException(404, "Hospital not found")
 
-    req_id = create_document("request", payload)
+    req = payload.model_dump()
+    req["_id"] = ObjectId()
+    req_id = str(req["_id"])
 
-    # notification stub for donor
-    create_document("notification", {
-        "to_email": donor.get("email"),
-        "subject": "Blood Request",
-        "message": f"{hospital.get('name')} requested {payload.units} unit(s) of {payload.blood_group}.",
-        "meta": {"request_id": req_id}
-    })
+    # notification stub for donor, written after the request
+    await bulk_create([
+        ("request", req),
+        ("notification", {
+            "to_email": donor.get("email"),
+            "subject": "Blood Request",
+            "message": f"{hospital.get('name')} requested {payload.units} unit(s) of {payload.blood_group}.",
+            "meta": {"request_id": req_id}
+        }),
+    ])
     return {"id": req_id}
 
 @app.get("/requests", response_model=List[dict])
-def list_requests(status: Optional[str] = None, donor_id: Optional[str] = None, hospital_id: Optional[str] = None):
+async def list_requests(status: Optional[str] = None, donor_id: Optional[str] = None, hospital_id: Optional[str] = None):
     q = {}
     if status:
         q["status"] = status
@@ -138,25 +285,30 @@ def list_requests(status: Optional[str] = None, donor_id: Optional[str] = None,
         q["donor_id"] = donor_id
     if hospital_id:
         q["hospital_id"] = hospital_id
-    items = get_documents("request", q, None)
-    for it in items:
-        it["id"] = str(it.pop("_id"))
-    return items
+    items = await list_documents(
+        "request", q, None,
+        projection={"status": 1, "hospital_id": 1, "donor_id": 1, "blood_group": 1, "units": 1},
+    )
+    return MongoJSONResponse(items)
 
 class UpdateStatus(BaseModel):
     status: str
 
 @app.post("/requests/{request_id}/status")
-def update_request_status(request_id: str, payload: UpdateStatus):
+async def update_request_status(request_id: str, payload: UpdateStatus):
     if payload.status not in ["approved", "declined"]:
         raise HTTPException(400, "Status must be 'approved' or 'declined'")
-    res = db["request"].update_one({"_id": oid(request_id)}, {"$set": {"status": payload.status, "updated_at": datetime.utcnow()}})
-    if res.matched_count == 0:
+    req = await db["request"].find_one_and_update(
+        {"_id": oid(request_id)},
+        {"$set": {"status": payload.status, "updated_at": datetime.utcnow()}},
+        projection={"hospital_id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if req is None:
         raise HTTPException(404, "Request not found")
     # notify hospital
-    req = db["request"].find_one({"_id": oid(request_id)})
-    hospital = db["hospital"].find_one({"_id": oid(req["hospital_id"])})
-    create_document("notification", {
+    hospital = await db["hospital"].find_one({"_id": oid(req["hospital_id"])}, {"email": 1})
+    await create_document("notification", {
         "to_email": hospital.get("email") if hospital else None,
         "subject": f"Request {payload.status}",
         "message": f"Request {request_id} has been {payload.status} by the donor.",
@@ -166,32 +318,36 @@ def update_request_status(request_id: str, payload: UpdateStatus):
 # ---------------- Notifications (Email/SMS stubs) -----------------
 
 @app.post("/notify", response_model=dict)
-def create_notification(payload: Notification):
-    nid = create_document("notification", payload)
+async def create_notification(payload: Notification):
+    nid = await create_document("notification", payload)
     return {"id": nid}
 
 @app.get("/notifications", response_model=List[dict])
-def list_notifications(limit: Optional[int] = 50):
-    items = get_documents("notification", {}, limit)
-    for it in items:
-        it["id"] = str(it.pop("_id"))
-    return items
+@cached_response("notification")
+async def list_notifications(limit: int = Query(50, ge=1)):
+    items = await list_documents(
+        "notification", {}, limit,
+        projection={"subject": 1, "to_email": 1, "created_at": 1},
+    )
+    return MongoJSONResponse(items)
 
 # ---------------- Health -----------------
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Blood Donation Management API running"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
         "database_url": None,
         "database_name": None,
         "connection_status": "Not Connected",
-        "collections": []
+        "collections": [],
+        "startup_ping": None,
+        "indexes": None,
     }
     try:
         if db is not None:
@@ -199,7 +355,15 @@ def test_database():
             response["database_url"] = "✅ Set"
             response["database_name"] = getattr(db, 'name', '✅ Connected')
             response["connection_status"] = "Connected"
-            collections = db.list_collection_names()
+            if "ping" in startup_errors:
+                response["startup_ping"] = f"❌ Error: {startup_errors['ping'][:50]}"
+            else:
+                response["startup_ping"] = "✅ Ok"
+            if "indexes" in startup_errors:
+                response["indexes"] = f"❌ Error: {startup_errors['indexes'][:50]}"
+            else:
+                response["indexes"] = "✅ Ready"
+            collections = await db.list_collection_names()
             response["collections"] = collections[:10]
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:50]}"
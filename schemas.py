@@ -11,39 +11,67 @@ Model name is converted to lowercase for the collection name:
 - BlogPost -> "blogs" collection
 """
 
-from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, Literal
+import re
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, computed_field
+from typing import Annotated, Optional, Literal
 from datetime import date
 
 # ---------------- Blood Donation Management Schemas -----------------
 
+# Basic shape check; cheaper than EmailStr's full email-validator run
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+def _check_email(value: str) -> str:
+    if not _EMAIL_RE.fullmatch(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
+Email = Annotated[str, AfterValidator(_check_email)]
+
+# Payload models are validated once per request and never mutated; frozen=True
+# enforces that. The other settings only spell out pydantic v2's defaults and
+# have no performance effect.
+_PAYLOAD_CONFIG = ConfigDict(extra="ignore", frozen=True, str_strip_whitespace=False, validate_default=False)
+
 BloodGroup = Literal[
     "A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"
 ]
 
 class Donor(BaseModel):
+    model_config = _PAYLOAD_CONFIG
+
     name: str = Field(..., description="Full name")
-    email: EmailStr = Field(..., description="Email address")
+    email: Email = Field(..., description="Email address")
     phone: str = Field(..., description="Contact phone number")
     age: int = Field(..., ge=18, le=65, description="Age in years (18-65 eligible)")
     blood_group: BloodGroup
     health_ok: bool = Field(..., description="Self-declared good health status")
     city: Optional[str] = Field(None, description="City/Location")
-    eligible: bool = Field(True, description="Eligibility computed at registration")
+
+    @computed_field(description="Eligibility computed at registration")
+    @property
+    def eligible(self) -> bool:
+        return 18 <= self.age <= 65 and self.health_ok
 
 class Hospital(BaseModel):
+    model_config = _PAYLOAD_CONFIG
+
     name: str
-    email: EmailStr
+    email: Email
     phone: str
     city: Optional[str] = None
 
 class Inventory(BaseModel):
+    model_config = _PAYLOAD_CONFIG
+
     hospital_id: str = Field(..., description="Hospital ObjectId as string")
     blood_group: BloodGroup
     units: int = Field(..., ge=1, description="Units donated (1 unit ~ 450ml)")
     expiry_date: date = Field(..., description="Expiry date of this donation unit batch")
 
 class Request(BaseModel):
+    model_config = _PAYLOAD_CONFIG
+
     hospital_id: str
     donor_id: str
     blood_group: BloodGroup
@@ -51,7 +79,9 @@ class Request(BaseModel):
     status: Literal["pending", "approved", "declined"] = "pending"
 
 class Notification(BaseModel):
-    to_email: Optional[EmailStr] = None
+    model_config = _PAYLOAD_CONFIG
+
+    to_email: Optional[Email] = None
     to_phone: Optional[str] = None
     subject: str
     message: str